@@ -1,41 +1,69 @@
 """Configuration management using Pydantic Settings."""
 
+from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 from typing import Optional
 import os
 
 
+# Development servers run under the reloader, whose children inherit the parent's
+# environment; there each process reads .env itself so edits apply on reload.
+_READ_ENV_FILE_PER_PROCESS = os.environ.get("ENVIRONMENT", "development") == "development"
+
+# Otherwise load .env into the environment once per process tree. Worker processes
+# inherit os.environ from their parent, so they skip re-parsing the file.
+# Existing environment variables take precedence over .env values.
+if not _READ_ENV_FILE_PER_PROCESS and not os.environ.get("RECEIPTO_ENV_LOADED"):
+    load_dotenv(".env", override=False)
+    os.environ["RECEIPTO_ENV_LOADED"] = "1"
+
+
 class Settings(BaseSettings):
-    """Application settings loaded from environment variables."""
+    """
+    Application settings loaded from environment variables.
+
+    Secrets default to None and are filled from the environment by
+    pydantic-settings rather than read eagerly at import time.
+    """
 
     # Database
-    DATABASE_URL: str | None = os.environ.get("DATABASE_URL")
+    DATABASE_URL: str | None = None
     DB_POOL_MIN_SIZE: int = 5
     DB_POOL_MAX_SIZE: int = 20
+    DB_STATEMENT_CACHE_SIZE: int = 100  # prepared statements cached per connection
 
     # AWS Textract
-    AWS_ACCESS_KEY_ID: str | None = os.environ.get("AWS_ACCESS_KEY_ID")
-    AWS_SECRET_ACCESS_KEY: str | None = os.environ.get("AWS_SECRET_ACCES_KEY")
+    AWS_ACCESS_KEY_ID: str | None = None
+    AWS_SECRET_ACCESS_KEY: str | None = None
     AWS_REGION: str = "us-west-2"
 
     # Google Gemini
-    GOOGLE_API_KEY: str | None = os.environ.get("GOOGLE_API_KEY")
+    GOOGLE_API_KEY: str | None = None
     GEMINI_MODEL: str = "gemini-3.0-flash-exp"
 
     # Storage
     STORAGE_PATH: str = "/app/storage/receipts"
+    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
 
     # Processing
     TEXTRACT_MAX_RETRIES: int = 3
+    TEXTRACT_MAX_POOL_CONNECTIONS: int = 16  # concurrent Textract calls sharing kept-alive connections
     GEMINI_MAX_RETRIES: int = 3
+    LLM_MAX_BATCH: int = 1  # >1 coalesces concurrent extractions into one request
+    LLM_BATCH_WAIT_MS: int = 50
+    LLM_FALLBACK_PROVIDERS: str = ""  # "provider:model,..." raced against the configured provider
+    MAX_CONCURRENT_OCR: int = 8  # receipts in Textract at once (per worker process)
+    MAX_CONCURRENT_LLM: int = 8  # receipts awaiting an LLM extraction at once (per worker process)
     VALIDATION_TOLERANCE: float = 0.02  # 2% tolerance for sum validation
+    EXTRACTION_CACHE_MAX_AGE_DAYS: int = 30  # cached LLM extractions older than this are pruned at startup
 
     # App
     ENVIRONMENT: str = "development"
     LOG_LEVEL: str = "info"
+    THREAD_POOL_SIZE: int = 100
 
     class Config:
-        env_file = ".env"
+        env_file = ".env" if _READ_ENV_FILE_PER_PROCESS else None
         case_sensitive = True
 
 
@@ -0,0 +1,29 @@
+"""Logging setup for the Receipto API."""
+
+import logging
+import logging.handlers
+import queue
+import sys
+
+
+def configure_logging(level: str) -> logging.handlers.QueueListener:
+    """
+    Route root logging through a queue drained by a background thread.
+
+    Callers only enqueue records, so writing to stdout never blocks the
+    event loop. Returns the started listener; stop it on shutdown to flush.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+
+    root_logger = logging.getLogger()
+    root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root_logger.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
@@ -1,55 +1,123 @@
 """FastAPI application for Receipto receipt processing."""
 
 from contextlib import asynccontextmanager
+import asyncio
+import logging
 import os
+import time
 import uuid
-from typing import List
-from fastapi import FastAPI, UploadFile, File, HTTPException, status, BackgroundTasks
+from decimal import Decimal
+from typing import List, Optional, Tuple
+import anyio.to_thread
+import asyncpg
+import orjson
+from fastapi import FastAPI, UploadFile, File, HTTPException, status, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
+from uuid_utils.compat import uuid7
 
 from config import settings
-from models.database import db_manager
+from logging_config import configure_logging
+from middleware import MaxBodySizeMiddleware
+from models.database import db_manager, get_conn
 from models.schemas import UploadResponse
 from models.settings_schemas import (
     CategoryCreate, CategoryUpdate, Category,
     SettingsUpdate, SettingsResponse,
     LLMConfigUpdate, APIKeyUpdate, LLMModelsResponse, LLM_MODELS
 )
-from services.storage import StorageService
+from services.storage import StorageService, FileTooLargeError
 from services.database_ops import DatabaseService
+from services.extraction_cache import ExtractionCacheService
 from services.settings_ops import SettingsService, CategoryService
 from workflow.processor import receipt_processor
 
 
+logger = logging.getLogger(__name__)
+
+# MIME types accepted by the upload endpoint
+ALLOWED_UPLOAD_TYPES = frozenset({"image/jpeg", "image/png", "application/pdf"})
+
+# Allowance for multipart boundaries and part headers on top of the file size
+MULTIPART_OVERHEAD = 8192
+
+# Valid model IDs per LLM provider
+VALID_LLM_MODELS = {
+    provider: frozenset(model["id"] for model in models)
+    for provider, models in LLM_MODELS.items()
+}
+
+# LLM models are static, so the response body is encoded to bytes once at import
+LLM_MODELS_RESPONSE_BYTES = orjson.dumps(LLMModelsResponse().model_dump())
+
+# Categories change rarely; cache the serialized list in-process and invalidate on writes
+CATEGORIES_CACHE_TTL = 30  # seconds
+_categories_cache: Optional[Tuple[float, bytes]] = None
+# Bumped on every invalidation so a read that overlapped a write doesn't cache stale rows
+_categories_generation = 0
+
+
+def invalidate_categories_cache() -> None:
+    """Drop the cached categories list so the next read hits the database."""
+    global _categories_cache, _categories_generation
+    _categories_cache = None
+    _categories_generation += 1
+
+
+def _category_json_default(obj):
+    """orjson fallback for category rows: Records as dicts, Decimals as strings (as Pydantic does)."""
+    if isinstance(obj, asyncpg.Record):
+        return dict(obj)
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Lifespan context manager for FastAPI startup/shutdown.
 
     Initializes:
+    - Queue-backed logging
+    - Worker thread pool size
     - Database connection pool
     - Storage directory
     - LangGraph workflow
     """
     # Startup
+    log_listener = configure_logging(settings.LOG_LEVEL)
+    logger.info("🚀 Starting Receipto API...")
 
-
-    print("🚀 Starting Receipto API...")
+    # Raise AnyIO's default thread limit (40) used by sync code paths
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = settings.THREAD_POOL_SIZE
 
     # Initialize database pool
     await db_manager.connect()
 
+    # Bound the extraction cache (fails soft if migration 002 isn't applied yet)
+    try:
+        async with db_manager.acquire() as conn:
+            pruned = await ExtractionCacheService.prune(
+                conn, settings.EXTRACTION_CACHE_MAX_AGE_DAYS
+            )
+        logger.info("Pruned %d expired extraction cache entries", pruned)
+    except Exception as e:
+        logger.warning("Extraction cache prune skipped: %s", e)
+
     # Ensure storage directory exists
     StorageService.ensure_storage_directory()
 
-    print("✅ Receipto API ready")
+    logger.info("✅ Receipto API ready")
 
     yield
 
     # Shutdown
-    print("🛑 Shutting down Receipto API...")
+    logger.info("🛑 Shutting down Receipto API...")
     await db_manager.disconnect()
-    print("✅ Receipto API stopped")
+    logger.info("✅ Receipto API stopped")
+    log_listener.stop()
 
 
 # Create FastAPI app with lifespan
@@ -57,7 +125,16 @@ app = FastAPI(
     title="Receipto API",
     description="Receipt processing API with AWS Textract and Google Gemini",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# Reject oversized uploads before routing (registered first so CORS wraps it)
+app.add_middleware(
+    MaxBodySizeMiddleware,
+    paths={"/receipts/upload"},
+    max_size=settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+    detail="File size exceeds the 10MB limit."
 )
 
 # CORS configuration for frontend
@@ -70,41 +147,46 @@ app.add_middleware(
 )
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"Hello": "Receipto"}
 
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy"}
 
 
-@app.get("/health/detailed")
-async def detailed_health_check():
-    """Detailed health check including dependencies."""
-    health_status = {
-        "status": "healthy",
-        "database": "unknown",
-        "storage": "unknown"
-    }
-
-    # Check database
+async def check_database_health() -> str:
+    """Ping the database and return its health status."""
     try:
         async with db_manager.acquire() as conn:
             await conn.fetchval("SELECT 1")
-        health_status["database"] = "healthy"
+        return "healthy"
     except Exception as e:
-        health_status["database"] = f"unhealthy: {str(e)}"
-        health_status["status"] = "unhealthy"
+        return f"unhealthy: {str(e)}"
 
-    # Check storage
-    if os.path.exists(settings.STORAGE_PATH):
-        health_status["storage"] = "healthy"
-    else:
-        health_status["storage"] = "unhealthy: directory not found"
-        health_status["status"] = "unhealthy"
 
-    return health_status
+async def check_storage_health() -> str:
+    """Check the storage directory (off the event loop) and return its status."""
+    if await anyio.to_thread.run_sync(os.path.exists, settings.STORAGE_PATH):
+        return "healthy"
+    return "unhealthy: directory not found"
+
+
+@app.get("/health/detailed")
+async def detailed_health_check():
+    """Detailed health check including dependencies."""
+    database_status, storage_status = await asyncio.gather(
+        check_database_health(),
+        check_storage_health()
+    )
+
+    healthy = database_status == "healthy" and storage_status == "healthy"
+    return {
+        "status": "healthy" if healthy else "unhealthy",
+        "database": database_status,
+        "storage": storage_status
+    }
 
 
 async def process_receipt_background(receipt_id: uuid.UUID, file_path: str):
@@ -115,8 +197,8 @@ async def process_receipt_background(receipt_id: uuid.UUID, file_path: str):
     """
     try:
         await receipt_processor.process_receipt(receipt_id, file_path)
-    except Exception as e:
-        print(f"❌ Background processing error for {receipt_id}: {e}")
+    except Exception:
+        logger.exception("❌ Background processing error for %s", receipt_id)
         # Update receipt status to manual_review on error
         async with db_manager.acquire() as conn:
             await DatabaseService.update_receipt_status(
@@ -124,6 +206,29 @@ async def process_receipt_background(receipt_id: uuid.UUID, file_path: str):
             )
 
 
+async def create_receipt_record(receipt_id: uuid.UUID, image_url: str) -> None:
+    """Insert the initial 'pending' receipt record."""
+    async with db_manager.acquire() as conn:
+        await DatabaseService.create_initial_receipt(conn, receipt_id, image_url)
+
+
+async def discard_failed_upload(
+    receipt_id: uuid.UUID,
+    file_path: str,
+    save_failed: bool,
+    insert_failed: bool
+):
+    """Undo whichever half of a concurrent upload succeeded."""
+    try:
+        if save_failed and not insert_failed:
+            async with db_manager.acquire() as conn:
+                await DatabaseService.delete_receipt(conn, receipt_id)
+        if insert_failed and not save_failed:
+            await StorageService.delete_file(file_path)
+    except Exception:
+        logger.exception("❌ Upload cleanup error for %s", receipt_id)
+
+
 @app.post("/receipts/upload", response_model=UploadResponse)
 async def upload_receipt(
     background_tasks: BackgroundTasks,
@@ -133,190 +238,227 @@ async def upload_receipt(
     Upload receipt image/PDF for processing.
 
     Steps:
-    1. Validate file type and size
+    1. Validate file type
     2. Generate receipt ID
-    3. Save file to storage
-    4. Insert initial DB record with status='pending'
+    3. Stream file to storage, enforcing the size limit
+    4. Insert initial DB record with status='pending' (concurrently with 3)
     5. Trigger background processing task
     6. Return immediately with receipt ID
     """
-    # 1. Validate file type
-    allowed_types = ["image/jpeg", "image/png", "application/pdf"]
-    if file.content_type not in allowed_types:
+    # 1. Validate file type (declared size is checked by MaxBodySizeMiddleware)
+    if file.content_type not in ALLOWED_UPLOAD_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File type {file.content_type} not supported. Please upload JPG, PNG or PDF."
         )
 
-    # 2. Validate file size (max 10MB)
-    MAX_SIZE = 10 * 1024 * 1024  # 10MB
-    contents = await file.read()
-    if len(contents) > MAX_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail="File size exceeds the 10MB limit."
-        )
+    # 2. Generate receipt ID (time-ordered, so primary key inserts stay append-only)
+    receipt_id = uuid7()
 
-    try:
-        # 3. Generate receipt ID
-        receipt_id = uuid.uuid4()
+    # The stored path and URL depend only on the ID and type, so the
+    # database record can be written while the file is still streaming
+    file_path = StorageService.get_receipt_path(receipt_id, file.content_type)
+    image_url = StorageService.get_relative_url(file_path)
 
-        # 4. Save file to storage
-        file_path = await StorageService.save_file(
+    # 3-4. Stream file to storage (max 10MB) and insert initial DB record
+    save_result, insert_result = await asyncio.gather(
+        StorageService.save_file(
             receipt_id,
-            contents,
-            file.content_type
+            file,
+            file.content_type,
+            settings.MAX_UPLOAD_SIZE
+        ),
+        create_receipt_record(receipt_id, image_url),
+        return_exceptions=True
+    )
+
+    save_error = save_result if isinstance(save_result, BaseException) else None
+    insert_error = insert_result if isinstance(insert_result, BaseException) else None
+    if save_error is not None or insert_error is not None:
+        await discard_failed_upload(
+            receipt_id, file_path, save_error is not None, insert_error is not None
         )
-        image_url = StorageService.get_relative_url(file_path)
 
-        # 5. Insert initial database record
-        async with db_manager.acquire() as conn:
-            await DatabaseService.create_initial_receipt(
-                conn, receipt_id, image_url
+        if isinstance(save_error, FileTooLargeError):
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="File size exceeds the 10MB limit."
             )
 
-        # 6. Trigger background processing
-        background_tasks.add_task(
-            process_receipt_background,
-            receipt_id,
-            file_path
-        )
-
-        return UploadResponse(
-            receipt_id=str(receipt_id),
-            status="pending",
-            message="Receipt uploaded successfully and is now being processed."
-        )
-
-    except Exception as e:
-        print(f"❌ Upload error: {e}")
+        error = save_error if save_error is not None else insert_error
+        logger.error("❌ Upload error: %s", error, exc_info=error)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while processing the upload."
         )
 
+    # 5. Trigger background processing
+    background_tasks.add_task(
+        process_receipt_background,
+        receipt_id,
+        file_path
+    )
+
+    return UploadResponse(
+        receipt_id=str(receipt_id),
+        status="pending",
+        message="Receipt uploaded successfully and is now being processed."
+    )
+
 
 # =============================================================================
 # Settings Endpoints
 # =============================================================================
 
 @app.get("/settings", response_model=SettingsResponse)
-async def get_settings():
+async def get_settings(conn: asyncpg.pool.PoolConnectionProxy = Depends(get_conn, scope="function")):
     """Get all application settings."""
-    async with db_manager.acquire() as conn:
-        return await SettingsService.get_all_settings(conn)
+    return await SettingsService.get_all_settings(conn)
 
 
 @app.patch("/settings", response_model=SettingsResponse)
-async def update_settings(updates: SettingsUpdate):
+async def update_settings(
+    updates: SettingsUpdate,
+    conn: asyncpg.pool.PoolConnectionProxy = Depends(get_conn, scope="function")
+):
     """Update application settings."""
-    async with db_manager.acquire() as conn:
-        await SettingsService.update_settings(conn, updates)
-        return await SettingsService.get_all_settings(conn)
+    return await SettingsService.update_and_fetch(conn, updates)
 
 
 @app.patch("/settings/api-keys", response_model=SettingsResponse)
-async def update_api_keys(updates: APIKeyUpdate):
+async def update_api_keys(
+    updates: APIKeyUpdate,
+    conn: asyncpg.pool.PoolConnectionProxy = Depends(get_conn, scope="function")
+):
     """Update API keys."""
     settings_update = SettingsUpdate(**updates.model_dump(exclude_none=True))
-    async with db_manager.acquire() as conn:
-        await SettingsService.update_settings(conn, settings_update)
-        return await SettingsService.get_all_settings(conn)
+    return await SettingsService.update_and_fetch(conn, settings_update)
 
 
 @app.patch("/settings/llm", response_model=SettingsResponse)
-async def update_llm_config(config: LLMConfigUpdate):
+async def update_llm_config(
+    config: LLMConfigUpdate,
+    conn: asyncpg.pool.PoolConnectionProxy = Depends(get_conn, scope="function")
+):
     """Update LLM provider and model configuration."""
     # Validate model is valid for provider
-    valid_models = [m["id"] for m in LLM_MODELS.get(config.provider, [])]
-    if config.model not in valid_models:
+    if config.model not in VALID_LLM_MODELS.get(config.provider, frozenset()):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid model '{config.model}' for provider '{config.provider}'"
         )
 
     updates = SettingsUpdate(llm_provider=config.provider, llm_model=config.model)
-    async with db_manager.acquire() as conn:
-        await SettingsService.update_settings(conn, updates)
-        return await SettingsService.get_all_settings(conn)
+    return await SettingsService.update_and_fetch(conn, updates)
 
 
 @app.get("/llm/models", response_model=LLMModelsResponse)
 async def get_llm_models():
     """Get available LLM providers and models."""
-    return LLMModelsResponse()
+    return Response(content=LLM_MODELS_RESPONSE_BYTES, media_type="application/json")
 
 
 # =============================================================================
 # Categories Endpoints
 # =============================================================================
 
-@app.get("/categories", response_model=List[Category])
+@app.get(
+    "/categories",
+    response_model=None,
+    responses={status.HTTP_200_OK: {"model": List[Category]}}
+)
 async def get_categories():
-    """Get all categories."""
+    """Get all categories (cached for CATEGORIES_CACHE_TTL seconds)."""
+    global _categories_cache
+    if _categories_cache is not None:
+        cached_at, body = _categories_cache
+        if time.monotonic() - cached_at < CATEGORIES_CACHE_TTL:
+            return Response(content=body, media_type="application/json")
+
+    generation = _categories_generation
     async with db_manager.acquire() as conn:
-        categories = await CategoryService.get_all_categories(conn)
-        return categories
+        rows = await CategoryService.get_all_categories(conn)
+
+    body = orjson.dumps(rows, default=_category_json_default)
+    if generation == _categories_generation:
+        _categories_cache = (time.monotonic(), body)
+    return Response(content=body, media_type="application/json")
 
 
 @app.post("/categories", response_model=Category, status_code=status.HTTP_201_CREATED)
-async def create_category(category: CategoryCreate):
+async def create_category(
+    category: CategoryCreate,
+    conn: asyncpg.pool.PoolConnectionProxy = Depends(get_conn, scope="function")
+):
     """Create a new category."""
-    async with db_manager.acquire() as conn:
-        # Check for duplicate name
-        if await CategoryService.category_exists(conn, category.name):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Category '{category.name}' already exists"
-            )
+    # Check for duplicate name
+    if await CategoryService.category_exists(conn, category.name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Category '{category.name}' already exists"
+        )
+
+    created = await CategoryService.create_category(conn, category)
 
-        return await CategoryService.create_category(conn, category)
+    invalidate_categories_cache()
+    return created
 
 
 @app.get("/categories/{category_id}", response_model=Category)
-async def get_category(category_id: uuid.UUID):
+async def get_category(
+    category_id: uuid.UUID,
+    conn: asyncpg.pool.PoolConnectionProxy = Depends(get_conn, scope="function")
+):
     """Get a category by ID."""
-    async with db_manager.acquire() as conn:
-        category = await CategoryService.get_category(conn, category_id)
-        if not category:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Category not found"
-            )
-        return category
+    category = await CategoryService.get_category(conn, category_id)
+    if not category:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Category not found"
+        )
+    return category
 
 
 @app.patch("/categories/{category_id}", response_model=Category)
-async def update_category(category_id: uuid.UUID, updates: CategoryUpdate):
+async def update_category(
+    category_id: uuid.UUID,
+    updates: CategoryUpdate,
+    conn: asyncpg.pool.PoolConnectionProxy = Depends(get_conn, scope="function")
+):
     """Update a category."""
-    async with db_manager.acquire() as conn:
-        # Check category exists
-        existing = await CategoryService.get_category(conn, category_id)
-        if not existing:
+    # Check category exists
+    existing = await CategoryService.get_category(conn, category_id)
+    if not existing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Category not found"
+        )
+
+    # Check for duplicate name if name is being updated
+    if updates.name and updates.name != existing["name"]:
+        if await CategoryService.category_exists(conn, updates.name, exclude_id=category_id):
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Category not found"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Category '{updates.name}' already exists"
             )
 
-        # Check for duplicate name if name is being updated
-        if updates.name and updates.name != existing["name"]:
-            if await CategoryService.category_exists(conn, updates.name, exclude_id=category_id):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Category '{updates.name}' already exists"
-                )
+    result = await CategoryService.update_category(conn, category_id, updates)
 
-        result = await CategoryService.update_category(conn, category_id, updates)
-        return result
+    invalidate_categories_cache()
+    return result
 
 
 @app.delete("/categories/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_category(category_id: uuid.UUID):
+async def delete_category(
+    category_id: uuid.UUID,
+    conn: asyncpg.pool.PoolConnectionProxy = Depends(get_conn, scope="function")
+):
     """Delete a category."""
-    async with db_manager.acquire() as conn:
-        deleted = await CategoryService.delete_category(conn, category_id)
-        if not deleted:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Category not found"
-            )
+    deleted = await CategoryService.delete_category(conn, category_id)
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Category not found"
+        )
+
+    invalidate_categories_cache()
@@ -0,0 +1,60 @@
+"""ASGI middleware for the Receipto API."""
+
+from typing import Iterable
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class MaxBodySizeMiddleware:
+    """
+    Reject oversized POST bodies based on Content-Length before routing.
+
+    Runs ahead of the router, dependency resolution and multipart parsing,
+    so abusive uploads are answered with 413 without reading the body.
+    Bodies without a Content-Length (chunked) are counted as they stream
+    in and aborted with 413 as soon as they pass the limit, before the
+    multipart parser has spooled the rest.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str], max_size: int, detail: str):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_size = max_size
+        self.detail = detail
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"] in self.paths
+        ):
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_size:
+                        response = JSONResponse(
+                            {"detail": self.detail}, status_code=413
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+            else:
+                receive = self._limited_receive(receive)
+
+        await self.app(scope, receive, send)
+
+    def _limited_receive(self, receive: Receive) -> Receive:
+        """Wrap receive to raise 413 once the streamed body exceeds max_size."""
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # Re-raised by FastAPI's body parsing and rendered by ExceptionMiddleware
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        return limited_receive
@@ -0,0 +1,9 @@
+-- Migration: 002_extraction_cache
+-- Description: Cache validated LLM extractions keyed by OCR text, provider, model and prompt version
+-- Retention: rows older than EXTRACTION_CACHE_MAX_AGE_DAYS (default 30) are deleted on API startup
+
+CREATE TABLE IF NOT EXISTS extraction_cache (
+    key TEXT PRIMARY KEY,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
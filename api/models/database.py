@@ -1,11 +1,14 @@
 """Database connection pool management using asyncpg."""
 
+import logging
 import asyncpg
-from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 from config import settings
 
 
+logger = logging.getLogger(__name__)
+
+
 class DatabaseManager:
     """Manages asyncpg connection pool lifecycle."""
 
@@ -14,33 +17,46 @@ class DatabaseManager:
 
     async def connect(self):
         """Create connection pool on startup."""
+        # No custom type codecs: asyncpg's built-in uuid, numeric and timestamp
+        # codecs already use the binary protocol and are implemented in C;
+        # Python-level set_type_codec() overrides would be slower.
         self.pool = await asyncpg.create_pool(
             settings.DATABASE_URL,
             min_size=settings.DB_POOL_MIN_SIZE,
             max_size=settings.DB_POOL_MAX_SIZE,
             max_inactive_connection_lifetime=300,
             command_timeout=60,
+            statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        )
+        logger.info(
+            "✓ Database pool created: %s",
+            settings.DATABASE_URL.split('@')[1] if '@' in settings.DATABASE_URL else 'connected'
         )
-        print(f"✓ Database pool created: {settings.DATABASE_URL.split('@')[1] if '@' in settings.DATABASE_URL else 'connected'}")
 
     async def disconnect(self):
         """Close connection pool on shutdown."""
         if self.pool:
             await self.pool.close()
-            print("✓ Database pool closed")
+            logger.info("✓ Database pool closed")
 
-    @asynccontextmanager
-    async def acquire(self) -> AsyncGenerator[asyncpg.pool.PoolConnectionProxy, None]:
-        """Acquire a connection from the pool."""
+    def acquire(self) -> asyncpg.pool.PoolAcquireContext:
+        """Acquire a connection from the pool (use with ``async with``)."""
         if not self.pool:
             raise RuntimeError("Database pool not initialized")
 
-        conn = await self.pool.acquire()
-        try:
-            yield conn
-        finally:
-            await self.pool.release(conn)
+        return self.pool.acquire()
 
 
 # Global instance
 db_manager = DatabaseManager()
+
+
+async def get_conn() -> AsyncGenerator[asyncpg.pool.PoolConnectionProxy, None]:
+    """
+    FastAPI dependency yielding a pooled connection for the request.
+
+    Declare it with scope="function" so the connection is released when the
+    handler returns rather than after the response has been sent.
+    """
+    async with db_manager.acquire() as conn:
+        yield conn
@@ -5,9 +5,35 @@ from datetime import date
 from decimal import Decimal
 from typing import Optional, List
 import asyncpg
+from uuid_utils.compat import uuid7
 from models.schemas import ReceiptExtraction, LineItemExtraction
 
 
+# Hot-path statements. asyncpg prepares each distinct query text once per
+# connection and reuses it from the statement cache, so keep them as constants.
+INSERT_RECEIPT_SQL = """
+    INSERT INTO receipts (id, image_url, status, created_at)
+    VALUES ($1, $2, 'pending', CURRENT_TIMESTAMP)
+"""
+
+UPDATE_RECEIPT_STATUS_SQL = """
+    UPDATE receipts
+    SET status = $1, updated_at = CURRENT_TIMESTAMP
+    WHERE id = $2
+"""
+
+UPDATE_RECEIPT_DATA_SQL = """
+    UPDATE receipts
+    SET merchant_name = $1,
+        purchase_date = $2,
+        total_amount = $3,
+        tax_amount = $4,
+        status = 'complete',
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = $5
+"""
+
+
 class DatabaseService:
     """Handles all database CRUD operations."""
 
@@ -18,14 +44,7 @@ class DatabaseService:
         image_url: str
     ) -> None:
         """Insert initial receipt record with status='pending'."""
-        async with conn.transaction():
-            await conn.execute(
-                """
-                INSERT INTO receipts (id, image_url, status, created_at)
-                VALUES ($1, $2, 'pending', CURRENT_TIMESTAMP)
-                """,
-                receipt_id, image_url
-            )
+        await conn.execute(INSERT_RECEIPT_SQL, receipt_id, image_url)
 
     @staticmethod
     async def update_receipt_status(
@@ -34,15 +53,15 @@ class DatabaseService:
         status: str
     ) -> None:
         """Update receipt status."""
-        async with conn.transaction():
-            await conn.execute(
-                """
-                UPDATE receipts
-                SET status = $1, updated_at = CURRENT_TIMESTAMP
-                WHERE id = $2
-                """,
-                status, receipt_id
-            )
+        await conn.execute(UPDATE_RECEIPT_STATUS_SQL, status, receipt_id)
+
+    @staticmethod
+    async def delete_receipt(
+        conn: asyncpg.pool.PoolConnectionProxy,
+        receipt_id: uuid.UUID
+    ) -> None:
+        """Delete a receipt record (line items cascade)."""
+        await conn.execute("DELETE FROM receipts WHERE id = $1", receipt_id)
 
     @staticmethod
     async def save_receipt_data(
@@ -57,16 +76,7 @@ class DatabaseService:
         """
         # Update receipt record
         await conn.execute(
-            """
-            UPDATE receipts
-            SET merchant_name = $1,
-                purchase_date = $2,
-                total_amount = $3,
-                tax_amount = $4,
-                status = 'complete',
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = $5
-            """,
+            UPDATE_RECEIPT_DATA_SQL,
             extraction.merchant_name,
             extraction.purchase_date,
             extraction.total_amount,
@@ -74,17 +84,10 @@ class DatabaseService:
             receipt_id
         )
 
-        # Insert line items
-        for item in extraction.line_items:
-            await conn.execute(
-                """
-                INSERT INTO line_items (
-                    id, receipt_id, description, category,
-                    quantity, unit_price, total_price, created_at
-                )
-                VALUES ($1, $2, $3, $4, $5, $6, $7, CURRENT_TIMESTAMP)
-                """,
-                uuid.uuid4(),
+        # Insert line items in a single COPY (created_at uses the column default)
+        records = [
+            (
+                uuid7(),
                 receipt_id,
                 item.description,
                 item.category,
@@ -92,3 +95,14 @@ class DatabaseService:
                 item.unit_price,
                 item.total_price
             )
+            for item in extraction.line_items
+        ]
+        if records:
+            await conn.copy_records_to_table(
+                'line_items',
+                records=records,
+                columns=[
+                    'id', 'receipt_id', 'description', 'category',
+                    'quantity', 'unit_price', 'total_price'
+                ]
+            )
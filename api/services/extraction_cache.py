@@ -0,0 +1,80 @@
+"""Content-addressed cache of LLM receipt extractions."""
+
+import hashlib
+from typing import Optional
+import asyncpg
+from pydantic import ValidationError
+
+from models.schemas import ReceiptExtraction
+from services.llm_provider import LLMProvider
+
+
+class ExtractionCacheService:
+    """
+    Stores extractions keyed by OCR text, provider, model and prompt version.
+
+    Rows older than EXTRACTION_CACHE_MAX_AGE_DAYS are pruned at startup.
+    """
+
+    @staticmethod
+    def make_key(provider: LLMProvider, ocr_text: str) -> str:
+        """Build the cache key for an extraction request."""
+        digest = hashlib.sha256(
+            b"\x00".join([
+                provider.name.encode(),
+                provider.model.encode(),
+                provider.prompt_version.encode(),
+                ocr_text.encode(),
+            ])
+        )
+        return digest.hexdigest()
+
+    @staticmethod
+    async def get(
+        conn: asyncpg.pool.PoolConnectionProxy,
+        key: str
+    ) -> Optional[ReceiptExtraction]:
+        """Return the cached extraction, or None on a miss or schema mismatch."""
+        payload = await conn.fetchval(
+            "SELECT payload FROM extraction_cache WHERE key = $1",
+            key
+        )
+        if payload is None:
+            return None
+
+        try:
+            return ReceiptExtraction.model_validate_json(payload)
+        except ValidationError:
+            # Written by an incompatible schema version; treat as a miss
+            return None
+
+    @staticmethod
+    async def put(
+        conn: asyncpg.pool.PoolConnectionProxy,
+        key: str,
+        extraction: ReceiptExtraction
+    ) -> None:
+        """Store an extraction (first writer wins)."""
+        await conn.execute(
+            """
+            INSERT INTO extraction_cache (key, payload, created_at)
+            VALUES ($1, $2::jsonb, CURRENT_TIMESTAMP)
+            ON CONFLICT (key) DO NOTHING
+            """,
+            key, extraction.model_dump_json()
+        )
+
+    @staticmethod
+    async def prune(
+        conn: asyncpg.pool.PoolConnectionProxy,
+        max_age_days: int
+    ) -> int:
+        """Delete extractions older than max_age_days; returns the number removed."""
+        status = await conn.execute(
+            """
+            DELETE FROM extraction_cache
+            WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => $1)
+            """,
+            max_age_days
+        )
+        return int(status.split()[-1])
@@ -1,16 +1,143 @@
 """LLM provider abstraction for multi-provider support."""
 
 from abc import ABC, abstractmethod
-from typing import Type
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, Type, Union
 import asyncio
-from pydantic import BaseModel
-
+import hashlib
+import logging
+import time
+from google import genai
+from google.genai import types
+from openai import AsyncOpenAI
+from pydantic import BaseModel, TypeAdapter
+
+from config import settings
+from models.database import db_manager
 from models.schemas import ReceiptExtraction
 
 
+logger = logging.getLogger(__name__)
+
+# Bump whenever a prompt changes so cached extractions from the old prompt are bypassed
+PROMPT_VERSION = "v1"
+BATCH_PROMPT_VERSION = "batch-v1"
+
+_GEMINI_INSTRUCTIONS = """IMPORTANT INSTRUCTIONS:
+1. Normalize merchant names (e.g., "Wal-Mrt Super" → "Walmart")
+2. Convert dates to ISO 8601 format (YYYY-MM-DD)
+3. Extract all line items with descriptions, categories, quantities, and prices
+4. Categorize items appropriately: Groceries, Dining, Transportation, Utilities, Entertainment, Healthcare, Clothing, Home & Garden, Personal Care, Shopping, Other
+5. Ensure decimal precision for all monetary values
+6. If quantities are not specified, assume 1
+"""
+
+# Prompt text around the OCR data, per provider (prompt = HEAD + ocr_text + TAIL)
+_GEMINI_PROMPT_HEAD = (
+    "\nYou are a receipt data extraction expert. Extract structured information "
+    "from this receipt OCR data.\n\n"
+    + _GEMINI_INSTRUCTIONS
+    + "\nRECEIPT DATA:\n"
+)
+
+_GEMINI_PROMPT_TAIL = """
+
+Extract the complete structured data.
+"""
+
+# Batched Gemini prompt (prompt = HEAD.format(count=n) + numbered receipts + TAIL)
+_GEMINI_BATCH_PROMPT_HEAD = (
+    "\nYou are a receipt data extraction expert. Extract structured information "
+    "from each of the {count} receipts below.\n\n"
+    + _GEMINI_INSTRUCTIONS
+    + "7. Return a JSON array with exactly one object per receipt, in receipt number order\n"
+    + "\nRECEIPTS:\n"
+)
+
+_GEMINI_BATCH_PROMPT_TAIL = """
+
+Extract the complete structured data for every receipt.
+"""
+
+_OPENAI_PROMPT_HEAD = """Extract structured information from this receipt OCR data.
+
+IMPORTANT INSTRUCTIONS:
+1. Normalize merchant names (e.g., "Wal-Mrt Super" → "Walmart")
+2. Convert dates to ISO 8601 format (YYYY-MM-DD)
+3. Extract all line items with descriptions, categories, quantities, and prices
+4. Categorize items: Groceries, Dining, Transportation, Utilities, Entertainment, Healthcare, Clothing, Home & Garden, Personal Care, Shopping, Other
+5. Ensure decimal precision for all monetary values
+6. If quantities are not specified, assume 1
+
+Return a JSON object with this structure:
+{
+  "merchant_name": "string",
+  "purchase_date": "YYYY-MM-DD",
+  "total_amount": number,
+  "tax_amount": number,
+  "line_items": [
+    {
+      "description": "string",
+      "category": "string",
+      "quantity": number,
+      "unit_price": number,
+      "total_price": number
+    }
+  ]
+}
+
+RECEIPT DATA:
+"""
+
+_OPENAI_PROMPT_TAIL = """
+"""
+
+_ANTHROPIC_PROMPT_HEAD = """Extract structured information from this receipt OCR data.
+
+IMPORTANT INSTRUCTIONS:
+1. Normalize merchant names (e.g., "Wal-Mrt Super" → "Walmart")
+2. Convert dates to ISO 8601 format (YYYY-MM-DD)
+3. Extract all line items with descriptions, categories, quantities, and prices
+4. Categorize items: Groceries, Dining, Transportation, Utilities, Entertainment, Healthcare, Clothing, Home & Garden, Personal Care, Shopping, Other
+5. Ensure decimal precision for all monetary values
+6. If quantities are not specified, assume 1
+
+Return ONLY a valid JSON object (no markdown, no explanation) with this structure:
+{
+  "merchant_name": "string",
+  "purchase_date": "YYYY-MM-DD",
+  "total_amount": number,
+  "tax_amount": number,
+  "line_items": [
+    {
+      "description": "string",
+      "category": "string",
+      "quantity": number,
+      "unit_price": number,
+      "total_price": number
+    }
+  ]
+}
+
+RECEIPT DATA:
+"""
+
+_ANTHROPIC_PROMPT_TAIL = """
+"""
+
+# Validates a JSON array of extractions returned by a batched request
+RECEIPT_LIST_ADAPTER = TypeAdapter(List[ReceiptExtraction])
+
+
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
 
+    name: str
+    model: str
+    prompt_version: str = PROMPT_VERSION
+    batch_prompt_version: Optional[str] = None  # set when extract_receipt_batch uses its own prompt
+    _PROMPT_HEAD: str
+    _PROMPT_TAIL: str
+
     @abstractmethod
     async def extract_receipt_data(
         self,
@@ -20,12 +147,34 @@ class LLMProvider(ABC):
         """Extract structured receipt data from OCR text."""
         pass
 
+    async def extract_receipt_batch(
+        self,
+        ocr_texts: List[str]
+    ) -> Sequence[Union[ReceiptExtraction, BaseException]]:
+        """
+        Extract several receipts, returning results in input order.
+
+        Providers without a native batch prompt make one call per receipt; a
+        failed receipt is returned as its exception instead of failing the rest.
+        """
+        return await asyncio.gather(
+            *(self.extract_receipt_data(ocr_text) for ocr_text in ocr_texts),
+            return_exceptions=True
+        )
+
+    def _build_prompt(self, ocr_text: str) -> str:
+        return self._PROMPT_HEAD + ocr_text + self._PROMPT_TAIL
+
 
 class GeminiProvider(LLMProvider):
     """Google Gemini LLM provider."""
 
+    name = "gemini"
+    batch_prompt_version = BATCH_PROMPT_VERSION
+    _PROMPT_HEAD = _GEMINI_PROMPT_HEAD
+    _PROMPT_TAIL = _GEMINI_PROMPT_TAIL
+
     def __init__(self, api_key: str, model: str = "gemini-2.0-flash"):
-        from google import genai
         self.client = genai.Client(api_key=api_key)
         self.model = model
 
@@ -34,12 +183,9 @@ class GeminiProvider(LLMProvider):
         ocr_text: str,
         schema: Type[BaseModel] = ReceiptExtraction
     ) -> ReceiptExtraction:
-        from google.genai import types
-
         prompt = self._build_prompt(ocr_text)
 
-        response = await asyncio.to_thread(
-            self.client.models.generate_content,
+        response = await self.client.aio.models.generate_content(
             model=self.model,
             contents=prompt,
             config=types.GenerateContentConfig(
@@ -50,31 +196,52 @@ class GeminiProvider(LLMProvider):
 
         return schema.model_validate_json(response.text)
 
-    def _build_prompt(self, ocr_text: str) -> str:
-        return f"""
-You are a receipt data extraction expert. Extract structured information from this receipt OCR data.
+    async def extract_receipt_batch(
+        self,
+        ocr_texts: List[str]
+    ) -> List[ReceiptExtraction]:
+        """Extract several receipts with one request returning a JSON array."""
+        prompt = self._build_batch_prompt(ocr_texts)
 
-IMPORTANT INSTRUCTIONS:
-1. Normalize merchant names (e.g., "Wal-Mrt Super" → "Walmart")
-2. Convert dates to ISO 8601 format (YYYY-MM-DD)
-3. Extract all line items with descriptions, categories, quantities, and prices
-4. Categorize items appropriately: Groceries, Dining, Transportation, Utilities, Entertainment, Healthcare, Clothing, Home & Garden, Personal Care, Shopping, Other
-5. Ensure decimal precision for all monetary values
-6. If quantities are not specified, assume 1
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=list[ReceiptExtraction],
+            )
+        )
 
-RECEIPT DATA:
-{ocr_text}
+        if not response.text:
+            raise ValueError("Batched extraction returned an empty response")
+        results = RECEIPT_LIST_ADAPTER.validate_json(response.text)
+        if len(results) != len(ocr_texts):
+            raise ValueError(
+                f"Batched extraction returned {len(results)} receipts, expected {len(ocr_texts)}"
+            )
+        return results
 
-Extract the complete structured data.
-"""
+    def _build_batch_prompt(self, ocr_texts: List[str]) -> str:
+        receipts = "\n---\n".join(
+            f"Receipt #{index}:\n{ocr_text}"
+            for index, ocr_text in enumerate(ocr_texts, 1)
+        )
+        return (
+            _GEMINI_BATCH_PROMPT_HEAD.format(count=len(ocr_texts))
+            + receipts
+            + _GEMINI_BATCH_PROMPT_TAIL
+        )
 
 
 class OpenAIProvider(LLMProvider):
     """OpenAI LLM provider."""
 
+    name = "openai"
+    _PROMPT_HEAD = _OPENAI_PROMPT_HEAD
+    _PROMPT_TAIL = _OPENAI_PROMPT_TAIL
+
     def __init__(self, api_key: str, model: str = "gpt-4o"):
-        from openai import OpenAI
-        self.client = OpenAI(api_key=api_key)
+        self.client = AsyncOpenAI(api_key=api_key)
         self.model = model
 
     async def extract_receipt_data(
@@ -84,8 +251,7 @@ class OpenAIProvider(LLMProvider):
     ) -> ReceiptExtraction:
         prompt = self._build_prompt(ocr_text)
 
-        response = await asyncio.to_thread(
-            self.client.chat.completions.create,
+        response = await self.client.chat.completions.create(
             model=self.model,
             messages=[
                 {"role": "system", "content": "You are a receipt data extraction expert."},
@@ -96,45 +262,17 @@ class OpenAIProvider(LLMProvider):
 
         return schema.model_validate_json(response.choices[0].message.content)
 
-    def _build_prompt(self, ocr_text: str) -> str:
-        return f"""Extract structured information from this receipt OCR data.
-
-IMPORTANT INSTRUCTIONS:
-1. Normalize merchant names (e.g., "Wal-Mrt Super" → "Walmart")
-2. Convert dates to ISO 8601 format (YYYY-MM-DD)
-3. Extract all line items with descriptions, categories, quantities, and prices
-4. Categorize items: Groceries, Dining, Transportation, Utilities, Entertainment, Healthcare, Clothing, Home & Garden, Personal Care, Shopping, Other
-5. Ensure decimal precision for all monetary values
-6. If quantities are not specified, assume 1
-
-Return a JSON object with this structure:
-{{
-  "merchant_name": "string",
-  "purchase_date": "YYYY-MM-DD",
-  "total_amount": number,
-  "tax_amount": number,
-  "line_items": [
-    {{
-      "description": "string",
-      "category": "string",
-      "quantity": number,
-      "unit_price": number,
-      "total_price": number
-    }}
-  ]
-}}
-
-RECEIPT DATA:
-{ocr_text}
-"""
-
 
 class AnthropicProvider(LLMProvider):
     """Anthropic Claude LLM provider."""
 
+    name = "anthropic"
+    _PROMPT_HEAD = _ANTHROPIC_PROMPT_HEAD
+    _PROMPT_TAIL = _ANTHROPIC_PROMPT_TAIL
+
     def __init__(self, api_key: str, model: str = "claude-sonnet-4-20250514"):
         import anthropic
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = anthropic.AsyncAnthropic(api_key=api_key)
         self.model = model
 
     async def extract_receipt_data(
@@ -144,8 +282,7 @@ class AnthropicProvider(LLMProvider):
     ) -> ReceiptExtraction:
         prompt = self._build_prompt(ocr_text)
 
-        response = await asyncio.to_thread(
-            self.client.messages.create,
+        response = await self.client.messages.create(
             model=self.model,
             max_tokens=4096,
             messages=[
@@ -156,49 +293,132 @@ class AnthropicProvider(LLMProvider):
         # Extract JSON from response
         content = response.content[0].text
 
-        # Try to find JSON in the response
-        import json
-        import re
-
-        # Look for JSON block
-        json_match = re.search(r'\{[\s\S]*\}', content)
-        if json_match:
-            json_str = json_match.group()
-            return schema.model_validate_json(json_str)
+        # Take the outermost {...} span (same as a greedy regex, without one)
+        start = content.find('{')
+        end = content.rfind('}')
+        if start != -1 and end > start:
+            return schema.model_validate_json(content[start:end + 1])
 
         raise ValueError("Could not extract JSON from Anthropic response")
 
-    def _build_prompt(self, ocr_text: str) -> str:
-        return f"""Extract structured information from this receipt OCR data.
 
-IMPORTANT INSTRUCTIONS:
-1. Normalize merchant names (e.g., "Wal-Mrt Super" → "Walmart")
-2. Convert dates to ISO 8601 format (YYYY-MM-DD)
-3. Extract all line items with descriptions, categories, quantities, and prices
-4. Categorize items: Groceries, Dining, Transportation, Utilities, Entertainment, Healthcare, Clothing, Home & Garden, Personal Care, Shopping, Other
-5. Ensure decimal precision for all monetary values
-6. If quantities are not specified, assume 1
+class BatchedLLMProvider(LLMProvider):
+    """
+    Wraps a provider to coalesce concurrent extractions into batch requests.
 
-Return ONLY a valid JSON object (no markdown, no explanation) with this structure:
-{{
-  "merchant_name": "string",
-  "purchase_date": "YYYY-MM-DD",
-  "total_amount": number,
-  "tax_amount": number,
-  "line_items": [
-    {{
-      "description": "string",
-      "category": "string",
-      "quantity": number,
-      "unit_price": number,
-      "total_price": number
-    }}
-  ]
-}}
+    Requests are queued; a background task collects up to max_batch of them,
+    waiting at most max_wait_ms after the first, and sends them through the
+    wrapped provider's extract_receipt_batch. Each caller awaits its own result.
+    Every batch, including a batch of one, goes through the same prompt, whose
+    version is reported as prompt_version.
+    """
+
+    def __init__(self, inner: LLMProvider, max_batch: int, max_wait_ms: int):
+        self.inner = inner
+        self.name = inner.name
+        self.model = inner.model
+        self.prompt_version = inner.batch_prompt_version or inner.prompt_version
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._collector: Optional[asyncio.Task] = None
+        # Strong references to in-flight dispatches so they aren't garbage-collected
+        self._dispatches: Set[asyncio.Task] = set()
+
+    async def extract_receipt_data(
+        self,
+        ocr_text: str,
+        schema: Type[BaseModel] = ReceiptExtraction
+    ) -> ReceiptExtraction:
+        if schema is not ReceiptExtraction:
+            return await self.inner.extract_receipt_data(ocr_text, schema)
+
+        if self._collector is None or self._collector.done():
+            self._collector = asyncio.create_task(self._collect_batches())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((ocr_text, future))
+        return await future
+
+    async def _collect_batches(self) -> None:
+        """Group queued requests into batches and dispatch them until idle."""
+        loop = asyncio.get_running_loop()
+        while not self._queue.empty():
+            batch = [self._queue.get_nowait()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """Run one batch and resolve each caller's future with its own outcome."""
+        try:
+            results = await self.inner.extract_receipt_batch(
+                [ocr_text for ocr_text, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
 
-RECEIPT DATA:
-{ocr_text}
-"""
+
+# Provider instances keyed by (provider, model, sha256(api_key)). Reusing an
+# instance keeps its SDK client's HTTP connection pool alive across receipts.
+_provider_cache: Dict[Tuple[str, str, str], LLMProvider] = {}
+
+# Provider selected by the current settings, kept briefly so the receipt
+# processing path can skip the database entirely
+CONFIGURED_PROVIDER_TTL = 30  # seconds
+_configured_provider: Optional[Tuple[float, LLMProvider]] = None
+
+# Resolved LLM_FALLBACK_PROVIDERS list, kept for the same TTL
+_fallback_providers: Optional[Tuple[float, List[LLMProvider]]] = None
+
+
+def invalidate_provider_cache() -> None:
+    """Drop all cached provider instances (e.g. after keys or model change)."""
+    global _configured_provider, _fallback_providers
+    _provider_cache.clear()
+    _configured_provider = None
+    _fallback_providers = None
+
+
+def _cached_provider(
+    provider_class: Callable[..., LLMProvider],
+    provider: str,
+    model: str,
+    api_key: str
+) -> LLMProvider:
+    """Return the cached provider for these credentials, creating it on a miss."""
+    key = (provider, model, hashlib.sha256(api_key.encode()).hexdigest())
+    instance = _provider_cache.get(key)
+    if instance is None:
+        instance = provider_class(api_key=api_key, model=model)
+        if settings.LLM_MAX_BATCH > 1:
+            instance = BatchedLLMProvider(
+                instance, settings.LLM_MAX_BATCH, settings.LLM_BATCH_WAIT_MS
+            )
+        _provider_cache[key] = instance
+    return instance
 
 
 async def get_llm_provider(
@@ -210,6 +430,9 @@ async def get_llm_provider(
     """
     Factory function to get the appropriate LLM provider.
 
+    Instances are cached per provider, model and API key, so repeated calls
+    reuse the same SDK client.
+
     Args:
         provider: Provider name (gemini, openai, anthropic)
         model: Model ID
@@ -223,23 +446,138 @@ async def get_llm_provider(
         api_key = await settings_service.get_setting(conn, "google_api_key")
         if not api_key:
             # Fall back to environment variable
-            from config import settings
             api_key = settings.GOOGLE_API_KEY
         if not api_key:
             raise ValueError("Google API key not configured")
-        return GeminiProvider(api_key=api_key, model=model)
+        return _cached_provider(GeminiProvider, provider, model, api_key)
 
     elif provider == "openai":
         api_key = await settings_service.get_setting(conn, "openai_api_key")
         if not api_key:
             raise ValueError("OpenAI API key not configured")
-        return OpenAIProvider(api_key=api_key, model=model)
+        return _cached_provider(OpenAIProvider, provider, model, api_key)
 
     elif provider == "anthropic":
         api_key = await settings_service.get_setting(conn, "anthropic_api_key")
         if not api_key:
             raise ValueError("Anthropic API key not configured")
-        return AnthropicProvider(api_key=api_key, model=model)
+        return _cached_provider(AnthropicProvider, provider, model, api_key)
 
     else:
         raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+async def get_configured_llm_provider(settings_service) -> LLMProvider:
+    """
+    Get the provider selected by the llm_provider/llm_model settings.
+
+    A database connection is acquired only when the cached selection has
+    expired or been invalidated by a settings change.
+
+    Args:
+        settings_service: SettingsService class for fetching settings
+
+    Returns:
+        Configured LLM provider instance
+    """
+    global _configured_provider
+    if _configured_provider is not None:
+        cached_at, provider = _configured_provider
+        if time.monotonic() - cached_at < CONFIGURED_PROVIDER_TTL:
+            return provider
+
+    async with db_manager.acquire() as conn:
+        selection = await settings_service.get_settings(conn, ("llm_provider", "llm_model"))
+        provider = await get_llm_provider(
+            provider=selection["llm_provider"] or "gemini",
+            model=selection["llm_model"] or "gemini-2.0-flash",
+            settings_service=settings_service,
+            conn=conn
+        )
+
+    _configured_provider = (time.monotonic(), provider)
+    return provider
+
+
+async def get_fallback_llm_providers(settings_service) -> List[LLMProvider]:
+    """
+    Get the providers listed in LLM_FALLBACK_PROVIDERS.
+
+    Malformed entries and providers without an API key are logged and
+    skipped. The resolved list is cached like the configured provider.
+
+    Args:
+        settings_service: SettingsService class for fetching API keys
+
+    Returns:
+        Provider instances in the configured order (empty if racing is off)
+    """
+    global _fallback_providers
+    entries = [
+        entry.strip() for entry in settings.LLM_FALLBACK_PROVIDERS.split(",")
+        if entry.strip()
+    ]
+    if not entries:
+        return []
+
+    if _fallback_providers is not None:
+        cached_at, cached = _fallback_providers
+        if time.monotonic() - cached_at < CONFIGURED_PROVIDER_TTL:
+            return cached
+
+    providers = []
+    async with db_manager.acquire() as conn:
+        for entry in entries:
+            provider_name, _, model_name = entry.partition(":")
+            if not model_name:
+                logger.warning("Skipping fallback provider '%s': expected 'provider:model'", entry)
+                continue
+            try:
+                providers.append(await get_llm_provider(
+                    provider=provider_name,
+                    model=model_name,
+                    settings_service=settings_service,
+                    conn=conn
+                ))
+            except ValueError as e:
+                logger.warning("Skipping fallback provider '%s': %s", entry, e)
+
+    _fallback_providers = (time.monotonic(), providers)
+    return providers
+
+
+async def extract_with_fallback(
+    providers: List[LLMProvider],
+    ocr_text: str
+) -> Tuple[LLMProvider, ReceiptExtraction]:
+    """
+    Run the extraction on all providers concurrently and return the first success.
+
+    Returns the winning provider together with its extraction. The remaining
+    requests are cancelled as soon as one succeeds. If every provider fails,
+    the first provider's error is raised.
+    """
+    tasks = [
+        asyncio.create_task(provider.extract_receipt_data(ocr_text))
+        for provider in providers
+    ]
+    task_providers = dict(zip(tasks, providers))
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Check every finished task so no exception is left unretrieved
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded:
+                winner = succeeded[0]
+                return task_providers[winner], winner.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    # Every task finished without a result, so each holds an exception
+    error = tasks[0].exception()
+    assert error is not None
+    raise error
@@ -1,36 +1,110 @@
 """Database operations for settings and categories."""
 
 import uuid
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable
 from decimal import Decimal
 import asyncpg
+import orjson
+from cachetools import TTLCache
+from pydantic import BaseModel
 
 from models.settings_schemas import (
     CategoryCreate, CategoryUpdate, Category,
     SettingsUpdate, SettingsResponse
 )
+from services.llm_provider import invalidate_provider_cache
 
 
 # Keys that contain sensitive data and should be marked as encrypted
-SENSITIVE_KEYS = {
+SENSITIVE_KEYS: frozenset[str] = frozenset({
     "aws_access_key_id",
     "aws_secret_access_key",
     "google_api_key",
     "openai_api_key",
     "anthropic_api_key",
-}
+})
+
+
+# Keys whose change affects which LLM provider client should be used
+LLM_PROVIDER_KEYS = SENSITIVE_KEYS | {"llm_provider", "llm_model"}
+
+# Short-lived cache for single-setting reads on the receipt processing path
+SETTING_CACHE_TTL = 30  # seconds
+_setting_cache: TTLCache = TTLCache(maxsize=64, ttl=SETTING_CACHE_TTL)
+
+# Statements are kept as constants so every call sends identical query text
+# and hits asyncpg's per-connection prepared statement cache.
+GET_ALL_SETTINGS_SQL = "SELECT jsonb_object_agg(key, value) FROM settings"
+
+GET_SETTING_SQL = "SELECT value FROM settings WHERE key = $1"
+
+GET_SETTINGS_SQL = "SELECT key, value FROM settings WHERE key = ANY($1::text[])"
+
+UPSERT_AND_FETCH_SETTINGS_SQL = """
+    WITH upserted AS (
+        INSERT INTO settings (key, value, encrypted, updated_at)
+        SELECT k, v, e, CURRENT_TIMESTAMP
+        FROM unnest($1::text[], $2::text[], $3::bool[]) AS t(k, v, e)
+        ON CONFLICT (key) DO UPDATE SET
+            value = EXCLUDED.value,
+            encrypted = EXCLUDED.encrypted,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING key, value
+    )
+    SELECT key, value FROM upserted
+    UNION ALL
+    SELECT key, value FROM settings
+    WHERE key NOT IN (SELECT key FROM upserted)
+"""
+
+DELETE_SETTING_SQL = "DELETE FROM settings WHERE key = $1"
+
+GET_ALL_CATEGORIES_SQL = """
+    SELECT id, name, monthly_budget_limit, created_at, updated_at
+    FROM categories
+    ORDER BY name
+"""
+
+GET_CATEGORY_SQL = """
+    SELECT id, name, monthly_budget_limit, created_at, updated_at
+    FROM categories
+    WHERE id = $1
+"""
+
+INSERT_CATEGORY_SQL = """
+    INSERT INTO categories (id, name, monthly_budget_limit, created_at, updated_at)
+    VALUES ($1, $2, $3, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    RETURNING id, name, monthly_budget_limit, created_at, updated_at
+"""
+
+DELETE_CATEGORY_SQL = "DELETE FROM categories WHERE id = $1"
+
+# Served by the unique index on categories(name)
+CATEGORY_NAME_EXISTS_SQL = """
+    SELECT EXISTS(
+        SELECT 1 FROM categories
+        WHERE name = $1 AND ($2::uuid IS NULL OR id != $2)
+    )
+"""
+
+
+
+def _explicit_updates(updates: BaseModel) -> Dict[str, Any]:
+    """Fields explicitly set to a non-None value, in declaration order (skips unset fields)."""
+    fields_set = updates.__pydantic_fields_set__
+    return {
+        key: value
+        for key in type(updates).model_fields
+        if key in fields_set and (value := getattr(updates, key)) is not None
+    }
 
 
 class SettingsService:
     """Handles database operations for settings."""
 
     @staticmethod
-    async def get_all_settings(conn: asyncpg.pool.PoolConnectionProxy) -> SettingsResponse:
-        """Get all settings, masking sensitive values."""
-        rows = await conn.fetch("SELECT key, value, encrypted FROM settings")
-
-        settings_dict = {row["key"]: row["value"] for row in rows}
-
+    def _build_settings_response(settings_dict: Dict[str, str]) -> SettingsResponse:
+        """Build a settings response from a key/value dict, masking sensitive values."""
         return SettingsResponse(
             llm_provider=settings_dict.get("llm_provider", "gemini"),
             llm_model=settings_dict.get("llm_model", "gemini-2.0-flash"),
@@ -43,40 +117,98 @@ class SettingsService:
             anthropic_api_key_configured=bool(settings_dict.get("anthropic_api_key")),
         )
 
+    @staticmethod
+    async def get_all_settings(conn: asyncpg.pool.PoolConnectionProxy) -> SettingsResponse:
+        """Get all settings, masking sensitive values."""
+        # Aggregated in Postgres into one jsonb value (returned as text, no codec registered)
+        raw = await conn.fetchval(GET_ALL_SETTINGS_SQL)
+        settings_dict = orjson.loads(raw) if raw else {}
+
+        return SettingsService._build_settings_response(settings_dict)
+
+    @staticmethod
+    def invalidate_cached(keys: Iterable[str]) -> None:
+        """Drop cached values for changed keys and any affected LLM clients."""
+        keys = set(keys)
+        for key in keys:
+            _setting_cache.pop(key, None)
+        if keys & LLM_PROVIDER_KEYS:
+            invalidate_provider_cache()
+
     @staticmethod
     async def get_setting(
         conn: asyncpg.pool.PoolConnectionProxy,
         key: str
     ) -> Optional[str]:
-        """Get a single setting value."""
-        row = await conn.fetchrow(
-            "SELECT value FROM settings WHERE key = $1",
-            key
-        )
-        return row["value"] if row else None
+        """Get a single setting value (cached for SETTING_CACHE_TTL seconds)."""
+        if key in _setting_cache:
+            return _setting_cache[key]
+
+        row = await conn.fetchrow(GET_SETTING_SQL, key)
+        value = row["value"] if row else None
+        _setting_cache[key] = value
+        return value
+
+    @staticmethod
+    def get_cached_settings(keys: Iterable[str]) -> Optional[Dict[str, Optional[str]]]:
+        """Return the values for keys if all are cached, otherwise None."""
+        values = {}
+        for key in keys:
+            if key not in _setting_cache:
+                return None
+            values[key] = _setting_cache[key]
+        return values
+
+    @staticmethod
+    async def get_settings(
+        conn: asyncpg.pool.PoolConnectionProxy,
+        keys: Iterable[str]
+    ) -> Dict[str, Optional[str]]:
+        """Get several setting values, fetching all cache misses in one query."""
+        values = {}
+        missing = []
+        for key in keys:
+            if key in _setting_cache:
+                values[key] = _setting_cache[key]
+            else:
+                missing.append(key)
+
+        if missing:
+            rows = await conn.fetch(GET_SETTINGS_SQL, missing)
+            found = {row["key"]: row["value"] for row in rows}
+            for key in missing:
+                value = found.get(key)
+                _setting_cache[key] = value
+                values[key] = value
+
+        return values
 
     @staticmethod
-    async def update_settings(
+    async def update_and_fetch(
         conn: asyncpg.pool.PoolConnectionProxy,
         updates: SettingsUpdate
-    ) -> None:
-        """Update multiple settings at once."""
-        update_data = updates.model_dump(exclude_none=True)
-
-        async with conn.transaction():
-            for key, value in update_data.items():
-                encrypted = key in SENSITIVE_KEYS
-                await conn.execute(
-                    """
-                    INSERT INTO settings (key, value, encrypted, updated_at)
-                    VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
-                    ON CONFLICT (key) DO UPDATE SET
-                        value = EXCLUDED.value,
-                        encrypted = EXCLUDED.encrypted,
-                        updated_at = CURRENT_TIMESTAMP
-                    """,
-                    key, str(value), encrypted
-                )
+    ) -> SettingsResponse:
+        """
+        Update settings and return the resulting settings in one round-trip.
+
+        The upsert and the read are a single statement: rows written by the
+        upsert come from its RETURNING clause, all other rows from the table.
+        """
+        update_data = _explicit_updates(updates)
+        if not update_data:
+            return await SettingsService.get_all_settings(conn)
+
+        keys = list(update_data)
+        values = [str(value) for value in update_data.values()]
+        encrypted = [key in SENSITIVE_KEYS for key in keys]
+
+        rows = await conn.fetch(UPSERT_AND_FETCH_SETTINGS_SQL, keys, values, encrypted)
+
+        SettingsService.invalidate_cached(keys)
+
+        settings_dict = {row["key"]: row["value"] for row in rows}
+
+        return SettingsService._build_settings_response(settings_dict)
 
     @staticmethod
     async def delete_setting(
@@ -84,7 +216,8 @@ class SettingsService:
         key: str
     ) -> None:
         """Delete a setting."""
-        await conn.execute("DELETE FROM settings WHERE key = $1", key)
+        await conn.execute(DELETE_SETTING_SQL, key)
+        SettingsService.invalidate_cached([key])
 
 
 class CategoryService:
@@ -93,16 +226,9 @@ class CategoryService:
     @staticmethod
     async def get_all_categories(
         conn: asyncpg.pool.PoolConnectionProxy
-    ) -> List[Dict[str, Any]]:
-        """Get all categories."""
-        rows = await conn.fetch(
-            """
-            SELECT id, name, monthly_budget_limit, created_at, updated_at
-            FROM categories
-            ORDER BY name
-            """
-        )
-        return [dict(row) for row in rows]
+    ) -> List[asyncpg.Record]:
+        """Get all categories as records (serialized directly at the response edge)."""
+        return await conn.fetch(GET_ALL_CATEGORIES_SQL)
 
     @staticmethod
     async def get_category(
@@ -110,14 +236,7 @@ class CategoryService:
         category_id: uuid.UUID
     ) -> Optional[Dict[str, Any]]:
         """Get a category by ID."""
-        row = await conn.fetchrow(
-            """
-            SELECT id, name, monthly_budget_limit, created_at, updated_at
-            FROM categories
-            WHERE id = $1
-            """,
-            category_id
-        )
+        row = await conn.fetchrow(GET_CATEGORY_SQL, category_id)
         return dict(row) if row else None
 
     @staticmethod
@@ -129,15 +248,12 @@ class CategoryService:
         category_id = uuid.uuid4()
 
         row = await conn.fetchrow(
-            """
-            INSERT INTO categories (id, name, monthly_budget_limit, created_at, updated_at)
-            VALUES ($1, $2, $3, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            RETURNING id, name, monthly_budget_limit, created_at, updated_at
-            """,
+            INSERT_CATEGORY_SQL,
             category_id,
             category.name,
             category.monthly_budget_limit
         )
+        assert row is not None  # INSERT ... RETURNING always yields the new row
         return dict(row)
 
     @staticmethod
@@ -147,7 +263,7 @@ class CategoryService:
         updates: CategoryUpdate
     ) -> Optional[Dict[str, Any]]:
         """Update a category."""
-        update_data = updates.model_dump(exclude_none=True)
+        update_data = _explicit_updates(updates)
 
         if not update_data:
             # No updates, just return current
@@ -181,10 +297,7 @@ class CategoryService:
         category_id: uuid.UUID
     ) -> bool:
         """Delete a category. Returns True if deleted."""
-        result = await conn.execute(
-            "DELETE FROM categories WHERE id = $1",
-            category_id
-        )
+        result = await conn.execute(DELETE_CATEGORY_SQL, category_id)
         return result == "DELETE 1"
 
     @staticmethod
@@ -193,15 +306,5 @@ class CategoryService:
         name: str,
         exclude_id: Optional[uuid.UUID] = None
     ) -> bool:
-        """Check if a category with the given name exists."""
-        if exclude_id:
-            row = await conn.fetchrow(
-                "SELECT 1 FROM categories WHERE name = $1 AND id != $2",
-                name, exclude_id
-            )
-        else:
-            row = await conn.fetchrow(
-                "SELECT 1 FROM categories WHERE name = $1",
-                name
-            )
-        return row is not None
+        """Check if a category with the given name exists (optionally ignoring one ID)."""
+        return await conn.fetchval(CATEGORY_NAME_EXISTS_SQL, name, exclude_id)
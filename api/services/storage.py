@@ -1,19 +1,52 @@
 """File storage operations for receipt images."""
 
+import contextlib
+import logging
 import os
 import uuid
-from pathlib import Path
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
 from config import settings
 
 
+logger = logging.getLogger(__name__)
+
+# Size of each chunk read from the upload and written to disk
+CHUNK_SIZE = 64 * 1024
+
+# Set once the storage directory has been created
+_storage_dir_ready = False
+
+# Map content type to extension
+EXTENSION_MAP = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "application/pdf": ".pdf"
+}
+
+# Stored paths always start with STORAGE_PATH, so URLs are built by slicing it off
+_STORAGE_PREFIX_LEN = len(settings.STORAGE_PATH)
+
+
+class FileTooLargeError(Exception):
+    """Raised when an uploaded file exceeds the allowed size."""
+    pass
+
+
 class StorageService:
     """Handles file storage operations."""
 
     @staticmethod
     def ensure_storage_directory():
-        """Create storage directory if it doesn't exist."""
-        Path(settings.STORAGE_PATH).mkdir(parents=True, exist_ok=True)
-        print(f"✓ Storage directory ready: {settings.STORAGE_PATH}")
+        """Create storage directory if it doesn't exist (once per process)."""
+        global _storage_dir_ready
+        if _storage_dir_ready:
+            return
+
+        os.makedirs(settings.STORAGE_PATH, exist_ok=True)
+        _storage_dir_ready = True
+        logger.info("✓ Storage directory ready: %s", settings.STORAGE_PATH)
 
     @staticmethod
     def get_file_path(receipt_id: uuid.UUID, extension: str) -> str:
@@ -21,40 +54,61 @@ class StorageService:
         filename = f"{receipt_id}{extension}"
         return os.path.join(settings.STORAGE_PATH, filename)
 
+    @staticmethod
+    def get_receipt_path(receipt_id: uuid.UUID, content_type: str) -> str:
+        """Generate file path for a receipt from its ID and MIME type."""
+        extension = EXTENSION_MAP.get(content_type, ".bin")
+
+        return StorageService.get_file_path(receipt_id, extension)
+
     @staticmethod
     async def save_file(
         receipt_id: uuid.UUID,
-        content: bytes,
-        content_type: str
+        file: UploadFile,
+        content_type: str,
+        max_size: int
     ) -> str:
         """
-        Save uploaded file to storage and return path.
+        Stream uploaded file to storage in chunks and return path.
 
         Args:
             receipt_id: UUID of the receipt
-            content: File content as bytes
+            file: Uploaded file to read from
             content_type: MIME type (image/jpeg, image/png, application/pdf)
+            max_size: Maximum allowed file size in bytes
 
         Returns:
             Full file path where the file was saved
-        """
-        # Map content type to extension
-        extension_map = {
-            "image/jpeg": ".jpg",
-            "image/png": ".png",
-            "application/pdf": ".pdf"
-        }
-        extension = extension_map.get(content_type, ".bin")
 
-        file_path = StorageService.get_file_path(receipt_id, extension)
+        Raises:
+            FileTooLargeError: If the file exceeds max_size (partial file is removed)
+        """
+        file_path = StorageService.get_receipt_path(receipt_id, content_type)
 
-        # Write file
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # Write file chunk by chunk, aborting as soon as the limit is exceeded
+        total_size = 0
+        try:
+            async with aiofiles.open(file_path, "wb") as f:
+                while chunk := await file.read(CHUNK_SIZE):
+                    total_size += len(chunk)
+                    if total_size > max_size:
+                        raise FileTooLargeError(
+                            f"File exceeds the {max_size} byte limit"
+                        )
+                    await f.write(chunk)
+        except BaseException:
+            await StorageService.delete_file(file_path)
+            raise
 
         return file_path
 
+    @staticmethod
+    async def delete_file(file_path: str) -> None:
+        """Remove a stored file if it exists, off the event loop."""
+        with contextlib.suppress(FileNotFoundError):
+            await aiofiles.os.remove(file_path)
+
     @staticmethod
     def get_relative_url(file_path: str) -> str:
         """Convert file path to relative URL for database."""
-        return file_path.replace(settings.STORAGE_PATH, "/storage/receipts")
+        return "/storage/receipts" + file_path[_STORAGE_PREFIX_LEN:]
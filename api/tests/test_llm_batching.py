@@ -0,0 +1,138 @@
+"""Tests for coalescing concurrent LLM extractions into batches."""
+
+import asyncio
+from decimal import Decimal
+
+from models.schemas import ReceiptExtraction
+from services.llm_provider import (
+    BatchedLLMProvider, LLMProvider, PROMPT_VERSION, BATCH_PROMPT_VERSION
+)
+
+
+def make_extraction(merchant_name):
+    """Build a minimal extraction tagged with the given merchant name."""
+    return ReceiptExtraction(
+        merchant_name=merchant_name,
+        purchase_date="2024-01-15",
+        total_amount=Decimal("1.00"),
+        tax_amount=Decimal("0.00"),
+        line_items=[]
+    )
+
+
+class FakeProvider(LLMProvider):
+    """Provider without a native batch prompt that records each call."""
+
+    name = "fake"
+    _PROMPT_HEAD = ""
+    _PROMPT_TAIL = ""
+
+    def __init__(self, fail_on=()):
+        self.model = "fake-model"
+        self.fail_on = set(fail_on)
+        self.batches = []
+
+    async def extract_receipt_data(self, ocr_text, schema=ReceiptExtraction):
+        if ocr_text in self.fail_on:
+            raise ValueError(f"cannot extract {ocr_text}")
+        return make_extraction(ocr_text)
+
+    async def extract_receipt_batch(self, ocr_texts):
+        self.batches.append(list(ocr_texts))
+        return await super().extract_receipt_batch(ocr_texts)
+
+
+class FakeBatchProvider(FakeProvider):
+    """Provider with a native batch prompt."""
+
+    batch_prompt_version = BATCH_PROMPT_VERSION
+
+
+async def extract_all(provider, ocr_texts):
+    """Submit extractions concurrently, returning results or exceptions in order."""
+    return await asyncio.gather(
+        *(provider.extract_receipt_data(ocr_text) for ocr_text in ocr_texts),
+        return_exceptions=True
+    )
+
+
+class TestBatchCollection:
+    """Tests for grouping queued requests into batches."""
+
+    def test_concurrent_requests_share_a_batch(self):
+        """Test requests submitted together are sent as one batch."""
+        inner = FakeProvider()
+        provider = BatchedLLMProvider(inner, max_batch=4, max_wait_ms=50)
+
+        results = asyncio.run(extract_all(provider, ["a", "b", "c"]))
+
+        assert [result.merchant_name for result in results] == ["A", "B", "C"]
+        assert inner.batches == [["a", "b", "c"]]
+
+    def test_batches_are_capped_at_max_batch(self):
+        """Test a full batch is dispatched without waiting for more requests."""
+        inner = FakeProvider()
+        provider = BatchedLLMProvider(inner, max_batch=2, max_wait_ms=50)
+
+        results = asyncio.run(extract_all(provider, ["a", "b", "c", "d", "e"]))
+
+        assert len(results) == 5
+        assert inner.batches == [["a", "b"], ["c", "d"], ["e"]]
+
+    def test_partial_batch_flushes_after_wait(self):
+        """Test a lone request is dispatched once max_wait_ms elapses."""
+        inner = FakeProvider()
+        provider = BatchedLLMProvider(inner, max_batch=8, max_wait_ms=10)
+
+        async def run():
+            first = await provider.extract_receipt_data("a")
+            second = await provider.extract_receipt_data("b")
+            return first, second
+
+        first, second = asyncio.run(asyncio.wait_for(run(), timeout=1))
+
+        assert (first.merchant_name, second.merchant_name) == ("A", "B")
+        assert inner.batches == [["a"], ["b"]]
+
+
+class TestBatchDispatch:
+    """Tests for resolving each caller from a batch result."""
+
+    def test_failed_receipt_does_not_fail_the_batch(self):
+        """Test one failed receipt only fails its own caller."""
+        inner = FakeProvider(fail_on={"b"})
+        provider = BatchedLLMProvider(inner, max_batch=4, max_wait_ms=50)
+
+        results = asyncio.run(extract_all(provider, ["a", "b", "c"]))
+
+        assert results[0].merchant_name == "A"
+        assert isinstance(results[1], ValueError)
+        assert results[2].merchant_name == "C"
+
+    def test_batch_request_failure_fails_every_caller(self):
+        """Test an error from the batch request reaches all callers."""
+        inner = FakeProvider()
+        provider = BatchedLLMProvider(inner, max_batch=4, max_wait_ms=50)
+
+        async def fail(ocr_texts):
+            raise RuntimeError("batch request failed")
+
+        inner.extract_receipt_batch = fail
+
+        results = asyncio.run(extract_all(provider, ["a", "b"]))
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+
+class TestBatchPromptVersion:
+    """Tests for the prompt version used in extraction cache keys."""
+
+    def test_per_receipt_provider_keeps_single_prompt_version(self):
+        """Test wrapping a provider without a batch prompt keeps its version."""
+        provider = BatchedLLMProvider(FakeProvider(), max_batch=4, max_wait_ms=50)
+        assert provider.prompt_version == PROMPT_VERSION
+
+    def test_native_batch_provider_reports_batch_prompt_version(self):
+        """Test wrapping a provider with a batch prompt reports that prompt's version."""
+        provider = BatchedLLMProvider(FakeBatchProvider(), max_batch=4, max_wait_ms=50)
+        assert provider.prompt_version == BATCH_PROMPT_VERSION
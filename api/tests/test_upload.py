@@ -3,6 +3,12 @@
 import io
 import uuid
 
+import pytest
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from middleware import MaxBodySizeMiddleware
+
 
 class TestUploadSuccess:
     """Tests for successful file uploads."""
@@ -224,3 +230,87 @@ class TestMultipleUploadsSequential:
         # Verify all uploads succeeded and generated unique IDs
         assert len(receipt_ids) == num_uploads
         assert len(set(receipt_ids)) == num_uploads  # All IDs are unique
+
+
+class TestMaxBodySizeMiddleware:
+    """Tests for rejecting oversized bodies before routing (no database needed)."""
+
+    @pytest.fixture
+    def limited_client(self):
+        """Client for a minimal app that echoes upload sizes behind a 1KB limit."""
+        app = FastAPI()
+        app.add_middleware(
+            MaxBodySizeMiddleware,
+            paths={"/upload"},
+            max_size=1024,
+            detail="Too large."
+        )
+
+        @app.post("/upload")
+        async def upload(file: UploadFile = File(...)):
+            return {"size": len(await file.read())}
+
+        @app.post("/raw")
+        async def raw(request: Request):
+            return {"size": len(await request.body())}
+
+        return TestClient(app)
+
+    def test_content_length_over_limit_returns_413(self, limited_client):
+        """Test a declared Content-Length over the limit is rejected up front."""
+        response = limited_client.post(
+            "/upload",
+            files={"file": ("big.png", io.BytesIO(b"x" * 2048), "image/png")}
+        )
+        assert response.status_code == 413
+        assert response.json()["detail"] == "Too large."
+
+    def test_content_length_under_limit_passes(self, limited_client):
+        """Test a body under the limit reaches the route."""
+        response = limited_client.post(
+            "/upload",
+            files={"file": ("small.png", io.BytesIO(b"x" * 100), "image/png")}
+        )
+        assert response.status_code == 200
+        assert response.json()["size"] == 100
+
+    @staticmethod
+    def multipart_chunks(payload_size):
+        """Stream a multipart file upload in 256-byte chunks (no Content-Length)."""
+        body = (
+            b"--boundary\r\n"
+            b'Content-Disposition: form-data; name="file"; filename="r.png"\r\n'
+            b"Content-Type: image/png\r\n\r\n"
+            + b"x" * payload_size
+            + b"\r\n--boundary--\r\n"
+        )
+        for start in range(0, len(body), 256):
+            yield body[start:start + 256]
+
+    def test_chunked_body_over_limit_returns_413(self, limited_client):
+        """Test a body without Content-Length is cut off once it passes the limit."""
+        response = limited_client.post(
+            "/upload",
+            content=self.multipart_chunks(4096),
+            headers={"Content-Type": "multipart/form-data; boundary=boundary"}
+        )
+        assert "content-length" not in response.request.headers
+        assert response.status_code == 413
+        assert response.json()["detail"] == "Too large."
+
+    def test_chunked_body_under_limit_passes(self, limited_client):
+        """Test a small body without Content-Length is delivered in full."""
+        response = limited_client.post(
+            "/upload",
+            content=self.multipart_chunks(300),
+            headers={"Content-Type": "multipart/form-data; boundary=boundary"}
+        )
+        assert "content-length" not in response.request.headers
+        assert response.status_code == 200
+        assert response.json()["size"] == 300
+
+    def test_other_paths_are_not_limited(self, limited_client):
+        """Test routes outside the configured paths accept large bodies."""
+        response = limited_client.post("/raw", content=b"x" * 4096)
+        assert response.status_code == 200
+        assert response.json()["size"] == 4096
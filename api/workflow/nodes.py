@@ -1,19 +1,87 @@
 """LangGraph workflow nodes for receipt processing."""
 
 import asyncio
+import hashlib
 import json
+import logging
+import random
 from decimal import Decimal
-from typing import Any
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+import aiofiles
 import boto3
-from tenacity import retry, stop_after_attempt, wait_exponential
+import httpx
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+from openai import APIConnectionError
 from config import settings
 from models.schemas import ReceiptExtraction
 from models.database import db_manager
+from services.database_ops import DatabaseService
 from services.settings_ops import SettingsService
-from services.llm_provider import get_llm_provider
+from services.llm_provider import (
+    get_configured_llm_provider, get_fallback_llm_providers, extract_with_fallback
+)
+from services.extraction_cache import ExtractionCacheService
 from workflow.state import ReceiptState
 
 
+logger = logging.getLogger(__name__)
+
+# Concurrent receipts call Textract from worker threads on a shared client;
+# size its connection pool so parallel calls don't discard and re-open TLS connections
+TEXTRACT_CLIENT_CONFIG = Config(max_pool_connections=settings.TEXTRACT_MAX_POOL_CONNECTIONS)
+
+# Settings holding the Textract credentials (fall back to env vars when unset)
+AWS_SETTING_KEYS = ("aws_access_key_id", "aws_secret_access_key", "aws_region")
+
+# Shared read-only default for missing Textract sub-objects (avoids a new {} per lookup)
+_EMPTY: dict = {}
+
+
+# Errors worth retrying: throttling, server-side failures and dropped connections
+TRANSIENT_AWS_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "LimitExceededException",
+    "InternalServerError",
+    "ServiceUnavailable",
+})
+TRANSIENT_HTTP_STATUSES = frozenset({408, 429})
+TRANSIENT_NETWORK_ERRORS = (
+    BotoConnectionError, HTTPClientError, httpx.TransportError,
+    APIConnectionError, TimeoutError,
+)
+
+T = TypeVar("T")
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Return True for Textract/LLM failures that may succeed on retry."""
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in TRANSIENT_AWS_ERROR_CODES or status >= 500
+    if isinstance(error, TRANSIENT_NETWORK_ERRORS) or isinstance(error.__cause__, httpx.TransportError):
+        return True
+    # LLM SDK status errors carry the HTTP status as status_code (OpenAI, Anthropic) or code (Gemini)
+    http_status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return isinstance(http_status, int) and (
+        http_status in TRANSIENT_HTTP_STATUSES or http_status >= 500
+    )
+
+
+async def _with_retries(call: Callable[[], Awaitable[T]], attempts: int) -> T:
+    """Await call(), retrying transient failures with capped exponential backoff plus jitter."""
+    for attempt in range(1, max(1, attempts)):
+        try:
+            return await call()
+        except Exception as e:
+            if not _is_transient(e):
+                raise
+            await asyncio.sleep(min(2 ** attempt, 10) + random.uniform(0, 0.25))
+    return await call()
+
+
 class WorkflowNodes:
     """Contains all LangGraph workflow nodes."""
 
@@ -24,60 +92,107 @@ class WorkflowNodes:
             'textract',
             aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
+            region_name=settings.AWS_REGION,
+            config=TEXTRACT_CLIENT_CONFIG
         )
 
+        # Cap in-flight Textract and LLM calls so upload bursts queue here
+        # instead of piling onto the connection pools and rate limits
+        self._ocr_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_OCR)
+        self._llm_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_LLM)
+
+        # Textract clients keyed by (access key, sha256(secret), region). boto3
+        # clients are thread-safe, and reusing one keeps its connection pool.
+        self._textract_clients: Dict[Tuple[Optional[str], str, Optional[str]], Any] = {
+            self._textract_client_key(
+                settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY, settings.AWS_REGION
+            ): self.textract
+        }
+
+    @staticmethod
+    def _textract_client_key(
+        aws_key: Optional[str],
+        aws_secret: Optional[str],
+        aws_region: Optional[str]
+    ) -> Tuple[Optional[str], str, Optional[str]]:
+        """Cache key for a set of AWS credentials (the secret is hashed)."""
+        return (aws_key, hashlib.sha256((aws_secret or "").encode()).hexdigest(), aws_region)
+
     async def _get_textract_client(self):
-        """Get Textract client with settings from database."""
-        async with db_manager.acquire() as conn:
-            aws_key = await SettingsService.get_setting(conn, "aws_access_key_id")
-            aws_secret = await SettingsService.get_setting(conn, "aws_secret_access_key")
-            aws_region = await SettingsService.get_setting(conn, "aws_region")
+        """Get Textract client with settings from database (cached per credentials)."""
+        # Only take a pool connection when the settings cache has expired
+        aws = SettingsService.get_cached_settings(AWS_SETTING_KEYS)
+        if aws is None:
+            async with db_manager.acquire() as conn:
+                aws = await SettingsService.get_settings(conn, AWS_SETTING_KEYS)
 
         # Use DB settings if available, otherwise fall back to env vars
-        return boto3.client(
-            'textract',
-            aws_access_key_id=aws_key or settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=aws_secret or settings.AWS_SECRET_ACCESS_KEY,
-            region_name=aws_region or settings.AWS_REGION
-        )
+        aws_key = aws["aws_access_key_id"] or settings.AWS_ACCESS_KEY_ID
+        aws_secret = aws["aws_secret_access_key"] or settings.AWS_SECRET_ACCESS_KEY
+        aws_region = aws["aws_region"] or settings.AWS_REGION
+
+        key = self._textract_client_key(aws_key, aws_secret, aws_region)
+        client = self._textract_clients.get(key)
+        if client is None:
+            client = boto3.client(
+                'textract',
+                aws_access_key_id=aws_key,
+                aws_secret_access_key=aws_secret,
+                region_name=aws_region,
+                config=TEXTRACT_CLIENT_CONFIG
+            )
+            self._textract_clients[key] = client
+        return client
 
-    @retry(
-        stop=stop_after_attempt(settings.TEXTRACT_MAX_RETRIES),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
-    )
     async def ocr_node(self, state: ReceiptState) -> ReceiptState:
         """
         Node 1: Extract text from receipt using AWS Textract AnalyzeExpense.
 
         Uses AnalyzeExpense (not DetectDocumentText) for receipt-specific extraction.
         """
-        print(f"[OCR Node] Processing receipt: {state['receipt_id']}")
+        logger.debug("[OCR Node] Processing receipt: %s", state['receipt_id'])
 
-        try:
-            # Get Textract client with current settings
-            textract_client = await self._get_textract_client()
+        # Resolve the LLM provider while Textract runs so extraction_node hits the cache
+        provider_task = asyncio.create_task(get_configured_llm_provider(SettingsService))
 
-            # Read image file
-            with open(state['image_path'], 'rb') as image_file:
-                image_bytes = image_file.read()
+        try:
+            async with self._ocr_semaphore:
+                # Get Textract client with current settings while reading the image
+                textract_client, image_bytes = await asyncio.gather(
+                    self._get_textract_client(),
+                    self._read_image(state['image_path'])
+                )
 
-            # Call Textract AnalyzeExpense in thread pool (it's sync)
-            response = await asyncio.to_thread(
-                textract_client.analyze_expense,
-                Document={'Bytes': image_bytes}
-            )
+                # Call Textract AnalyzeExpense in thread pool (it's sync),
+                # retrying only the RPC so the client and image are reused
+                response = await _with_retries(
+                    lambda: asyncio.to_thread(
+                        textract_client.analyze_expense,
+                        Document={'Bytes': image_bytes}
+                    ),
+                    settings.TEXTRACT_MAX_RETRIES
+                )
 
             state['raw_textract_output'] = response
-            print(f"[OCR Node] Textract analysis complete for {state['receipt_id']}")
+            logger.debug("[OCR Node] Textract analysis complete for %s", state['receipt_id'])
 
         except Exception as e:
             state['validation_errors'].append(f"OCR Error: {str(e)}")
             state['status'] = 'review_required'
-            print(f"[OCR Node] Error: {e}")
+            logger.warning("[OCR Node] Error: %s", e)
+
+        finally:
+            # Failures are reported by extraction_node when it resolves the provider
+            await asyncio.gather(provider_task, return_exceptions=True)
 
         return state
 
+    @staticmethod
+    async def _read_image(image_path: str) -> bytes:
+        """Read the receipt image from disk without blocking the event loop."""
+        async with aiofiles.open(image_path, 'rb') as image_file:
+            return await image_file.read()
+
     def _format_textract_for_llm(self, textract_output: dict) -> str:
         """
         Convert Textract AnalyzeExpense output to readable text for LLM.
@@ -86,39 +201,37 @@ class WorkflowNodes:
         - SummaryFields (merchant, total, tax, date)
         - LineItemGroups (individual items)
         """
-        formatted_text = "=== RECEIPT DATA ===\n\n"
+        # Collect fragments and join once instead of repeated str +=
+        parts = ["=== RECEIPT DATA ===\n\n"]
+        append = parts.append
 
-        for doc in textract_output.get('ExpenseDocuments', []):
+        for doc in textract_output.get('ExpenseDocuments', ()):
             # Summary fields
-            formatted_text += "SUMMARY FIELDS:\n"
-            for field in doc.get('SummaryFields', []):
-                field_type = field.get('Type', {}).get('Text', 'Unknown')
-                value = field.get('ValueDetection', {}).get('Text', '')
-                formatted_text += f"- {field_type}: {value}\n"
+            append("SUMMARY FIELDS:\n")
+            for field in doc.get('SummaryFields', ()):
+                field_type = field.get('Type', _EMPTY).get('Text', 'Unknown')
+                value = field.get('ValueDetection', _EMPTY).get('Text', '')
+                append(f"- {field_type}: {value}\n")
 
-            formatted_text += "\nLINE ITEMS:\n"
+            append("\nLINE ITEMS:\n")
             # Line items
-            for group in doc.get('LineItemGroups', []):
-                for item_idx, item in enumerate(group.get('LineItems', []), 1):
-                    formatted_text += f"\nItem {item_idx}:\n"
-                    for expense_field in item.get('LineItemExpenseFields', []):
-                        field_type = expense_field.get('Type', {}).get('Text', 'Unknown')
-                        value = expense_field.get('ValueDetection', {}).get('Text', '')
-                        formatted_text += f"  - {field_type}: {value}\n"
-
-        return formatted_text
-
-    @retry(
-        stop=stop_after_attempt(settings.GEMINI_MAX_RETRIES),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
-    )
+            for group in doc.get('LineItemGroups', ()):
+                for item_idx, item in enumerate(group.get('LineItems', ()), 1):
+                    append(f"\nItem {item_idx}:\n")
+                    for expense_field in item.get('LineItemExpenseFields', ()):
+                        field_type = expense_field.get('Type', _EMPTY).get('Text', 'Unknown')
+                        value = expense_field.get('ValueDetection', _EMPTY).get('Text', '')
+                        append(f"  - {field_type}: {value}\n")
+
+        return "".join(parts)
+
     async def extraction_node(self, state: ReceiptState) -> ReceiptState:
         """
         Node 2: Use configured LLM to extract structured data from OCR output.
 
         Dynamically selects LLM provider based on database settings.
         """
-        print(f"[Extraction Node] Processing receipt: {state['receipt_id']}")
+        logger.debug("[Extraction Node] Processing receipt: %s", state['receipt_id'])
 
         if not state.get('raw_textract_output'):
             state['validation_errors'].append("No OCR data available")
@@ -129,30 +242,64 @@ class WorkflowNodes:
             # Format Textract output for LLM
             ocr_text = self._format_textract_for_llm(state['raw_textract_output'])
 
-            # Get LLM provider and model from settings
-            async with db_manager.acquire() as conn:
-                provider_name = await SettingsService.get_setting(conn, "llm_provider") or "gemini"
-                model_name = await SettingsService.get_setting(conn, "llm_model") or "gemini-2.0-flash"
-
-                # Get configured LLM provider
-                llm_provider = await get_llm_provider(
-                    provider=provider_name,
-                    model=model_name,
-                    settings_service=SettingsService,
-                    conn=conn
-                )
-
-            print(f"[Extraction Node] Using {provider_name}/{model_name}")
+            # Get the LLM provider selected in settings (cached between receipts)
+            llm_provider = await get_configured_llm_provider(SettingsService)
+
+            # Reuse a previous extraction of identical OCR text if cached
+            cache_key = ExtractionCacheService.make_key(llm_provider, ocr_text)
+            try:
+                async with db_manager.acquire() as conn:
+                    cached = await ExtractionCacheService.get(conn, cache_key)
+            except Exception as e:
+                # Treat an unreadable cache (e.g. migration not applied) as a miss
+                logger.warning("[Extraction Node] Cache read failed: %s", e)
+                cached = None
+
+            if cached is not None:
+                extracted_data = cached
+                logger.debug("[Extraction Node] Cache hit for %s", state['receipt_id'])
+            else:
+                logger.debug("[Extraction Node] Using %s/%s", llm_provider.name, llm_provider.model)
+
+                try:
+                    fallback_providers = await get_fallback_llm_providers(SettingsService)
+                except Exception as e:
+                    # Fallbacks are optional; extract with the configured provider alone
+                    logger.warning("[Extraction Node] Fallback providers unavailable: %s", e)
+                    fallback_providers = []
+                async with self._llm_semaphore:
+                    if fallback_providers:
+                        # Race the configured provider against the fallbacks
+                        source_provider, extracted_data = await _with_retries(
+                            lambda: extract_with_fallback(
+                                [llm_provider, *fallback_providers], ocr_text
+                            ),
+                            settings.GEMINI_MAX_RETRIES
+                        )
+                    else:
+                        # Extract receipt data using configured provider
+                        source_provider = llm_provider
+                        extracted_data = await _with_retries(
+                            lambda: llm_provider.extract_receipt_data(ocr_text),
+                            settings.GEMINI_MAX_RETRIES
+                        )
+
+                # File the result under the provider that actually produced it
+                if source_provider is not llm_provider:
+                    cache_key = ExtractionCacheService.make_key(source_provider, ocr_text)
+                try:
+                    async with db_manager.acquire() as conn:
+                        await ExtractionCacheService.put(conn, cache_key, extracted_data)
+                except Exception as e:
+                    logger.warning("[Extraction Node] Cache write failed: %s", e)
 
-            # Extract receipt data using configured provider
-            extracted_data = await llm_provider.extract_receipt_data(ocr_text)
             state['cleaned_json'] = extracted_data
-            print(f"[Extraction Node] Extraction complete for {state['receipt_id']}")
+            logger.debug("[Extraction Node] Extraction complete for %s", state['receipt_id'])
 
         except Exception as e:
             state['validation_errors'].append(f"Extraction Error: {str(e)}")
             state['status'] = 'review_required'
-            print(f"[Extraction Node] Error: {e}")
+            logger.warning("[Extraction Node] Error: %s", e)
 
         return state
 
@@ -164,7 +311,7 @@ class WorkflowNodes:
         1. All required fields present
         2. Sum(line_items) + tax ≈ total (within tolerance)
         """
-        print(f"[Validation Node] Validating receipt: {state['receipt_id']}")
+        logger.debug("[Validation Node] Validating receipt: %s", state['receipt_id'])
 
         if not state.get('cleaned_json'):
             state['validation_errors'].append("No extracted data to validate")
@@ -197,10 +344,10 @@ class WorkflowNodes:
         if errors:
             state['validation_errors'].extend(errors)
             state['status'] = 'review_required'
-            print(f"[Validation Node] Validation failed: {errors}")
+            logger.info("[Validation Node] Validation failed: %s", errors)
         else:
             state['status'] = 'complete'
-            print(f"[Validation Node] Validation successful for {state['receipt_id']}")
+            logger.debug("[Validation Node] Validation successful for %s", state['receipt_id'])
 
         return state
 
@@ -210,45 +357,40 @@ class WorkflowNodes:
 
         Uses asyncpg to save receipt and line items.
         """
-        import uuid
-        from models.database import db_manager
-        from services.database_ops import DatabaseService
+        logger.debug("[Persistence Node] Saving receipt: %s", state['receipt_id'])
 
-        print(f"[Persistence Node] Saving receipt: {state['receipt_id']}")
-
-        if state['status'] != 'complete' or not state.get('cleaned_json'):
-            # Update status to manual_review
-            async with db_manager.acquire() as conn:
+        # One connection for the whole node, including the manual_review fallbacks
+        async with db_manager.acquire() as conn:
+            if state['status'] != 'complete' or not state.get('cleaned_json'):
+                # Update status to manual_review
                 await DatabaseService.update_receipt_status(
                     conn,
-                    uuid.UUID(state['receipt_id']),
+                    state['receipt_id'],
                     'manual_review'
                 )
-            print(f"[Persistence Node] Receipt marked for manual review: {state['receipt_id']}")
-            return state
+                logger.info("[Persistence Node] Receipt marked for manual review: %s", state['receipt_id'])
+                return state
 
-        try:
-            async with db_manager.acquire() as conn:
+            try:
                 # Use transaction for atomicity
                 async with conn.transaction():
                     await DatabaseService.save_receipt_data(
                         conn,
-                        uuid.UUID(state['receipt_id']),
+                        state['receipt_id'],
                         state['cleaned_json']
                     )
 
-            print(f"[Persistence Node] Successfully saved receipt: {state['receipt_id']}")
+                logger.debug("[Persistence Node] Successfully saved receipt: %s", state['receipt_id'])
 
-        except Exception as e:
-            state['validation_errors'].append(f"Database Error: {str(e)}")
-            state['status'] = 'review_required'
-            print(f"[Persistence Node] Error: {e}")
+            except Exception as e:
+                state['validation_errors'].append(f"Database Error: {str(e)}")
+                state['status'] = 'review_required'
+                logger.warning("[Persistence Node] Error: %s", e)
 
-            # Update status in database
-            async with db_manager.acquire() as conn:
+                # Update status in database (the failed transaction was rolled back)
                 await DatabaseService.update_receipt_status(
                     conn,
-                    uuid.UUID(state['receipt_id']),
+                    state['receipt_id'],
                     'manual_review'
                 )
 
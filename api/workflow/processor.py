@@ -1,10 +1,14 @@
 """High-level receipt processing workflow executor."""
 
+import logging
 import uuid
 from workflow.graph import create_receipt_workflow
 from workflow.state import ReceiptState
 
 
+logger = logging.getLogger(__name__)
+
+
 class ReceiptProcessor:
     """High-level processor for receipt workflow."""
 
@@ -26,11 +30,11 @@ class ReceiptProcessor:
         Returns:
             Final workflow state
         """
-        print(f"[Processor] Starting workflow for receipt: {receipt_id}")
+        logger.info("[Processor] Starting workflow for receipt: %s", receipt_id)
 
         # Initialize state
         initial_state: ReceiptState = {
-            'receipt_id': str(receipt_id),
+            'receipt_id': receipt_id,
             'image_path': image_path,
             'raw_textract_output': None,
             'cleaned_json': None,
@@ -41,7 +45,7 @@ class ReceiptProcessor:
         # Execute workflow
         final_state = await self.workflow.ainvoke(initial_state)
 
-        print(f"[Processor] Workflow complete for {receipt_id}. Status: {final_state['status']}")
+        logger.info("[Processor] Workflow complete for %s. Status: %s", receipt_id, final_state['status'])
 
         return final_state
 
@@ -1,12 +1,13 @@
 """LangGraph workflow state definition."""
 
+import uuid
 from typing import TypedDict, Literal, Optional
 from models.schemas import ReceiptExtraction
 
 
 class ReceiptState(TypedDict):
     """LangGraph workflow state for receipt processing."""
-    receipt_id: str
+    receipt_id: uuid.UUID
     image_path: str
     raw_textract_output: Optional[dict]
     cleaned_json: Optional[ReceiptExtraction]